@@ -13,66 +13,109 @@
 # v20 - added ability to cutprimer with reverse strand pairs of primers, F/5p primer in reverse strand, and R/3p primer in forward primer
 # v21 - added ability to reserve nsa amplicons, 2018-05-04
 # v22 - fix bug in determing 3' primer matching, 2018-6-2
+# v23 - added PrimerTrimmer class to trim reads from other python code without global variables
+#     - fix bug that single-end reads could not be trimmed
+#     - heavy modules are imported only when they are needed, that makes start of the script faster
+#     - added ability to save checkpoints and resume interrupted runs (--checkpoint, --resume)
 
 # Section of importing modules
+# Heavy modules (Bio, regex, editdistance, hashlib, multiprocessing) are imported
+# only by functions that use them, so --help, --version and
+# errors in arguments do not wait for them
 import os
 import sys
-from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio import pairwise2
-import glob,gzip
-import regex
-import time
-from multiprocessing import Pool,Queue
+import gzip
 import argparse
-import time,math
-from itertools import repeat
+import warnings
+import math
+import pickle
+from itertools import repeat,islice
 from operator import itemgetter
-import hashlib
-import editdistance
+from collections import namedtuple,deque
 
-__version__ = '1.22.0'
+__version__ = '1.23.0'
 
 def makeHashes(seq,k):
     # k is the length of parts
+    import hashlib
     h=[]
     lens=set([k])
     for i in range(len(seq)-k+1):
         h.append(hashlib.md5(seq[i:i+k].encode('utf-8')).hexdigest())
     return(h,lens)
 
-def initializer(maxPrimerLen2,primerLocBuf2,errNumber2,primersR1_52,primersR1_32,primersR2_52,primersR2_32,
-                primerR1_5_hashes2,primerR1_5_hashLens2,primerR2_5_hashes2,primerR2_5_hashLens2,
-                readsFileR22,primersStatistics2,idimer2,primer3absent2,minPrimer3Len2):
-    global primersR1_5,primersR1_3,primersR2_5,primersR2_3,readsFileR2
-    global trimmedReadsR1,trimmedReadsR2,untrimmedReadsR1,untrimmedReadsR2
-    global maxPrimerLen,q4,errNumber,primerLocBuf,readsPrimerNum,primersStatistics
-    global primerR1_5_hashes,primerR2_5_hashes,primerR1_5_hashLens,primerR2_5_hashLens,primer3absent,idimer
-    maxPrimerLen=maxPrimerLen2
-    primerLocBuf=primerLocBuf2
-    errNumber=errNumber2
-    primersR1_5=primersR1_52
-    primersR1_3=primersR1_32
-    primersR2_5=primersR2_52
-    primersR2_3=primersR2_32
-    primerR1_5_hashes=primerR1_5_hashes2; primerR1_5_hashLens=primerR1_5_hashLens2;
-    primerR2_5_hashes=primerR2_5_hashes2; primerR2_5_hashLens=primerR2_5_hashLens2
-    readsFileR2=readsFileR22
-    primersStatistics=primersStatistics2
-    idimer=idimer2
-    primer3absent=primer3absent2
-    minPrimer3Len=minPrimer3Len2
-
 # Section of functions
 def showPercWork(done,allWork):
     percDoneWork=round((done/allWork)*100,2)
     sys.stdout.write("\r"+str(percDoneWork)+"%")
     sys.stdout.flush()
 
+def openReadsFile(fileName,size=None):
+    # This function opens file for writing reads, files with extension .gz are gzipped
+    # If size is set, the file is cut to this size and new reads are appended to it
+    if size is None:
+        mode='w'
+    else:
+        if os.path.getsize(fileName)<size:
+            # File is shorter than it was at the checkpoint, so it was rewritten after it
+            print('########')
+            print('ERROR! File is shorter than at the checkpoint, so the run can not be resumed:',fileName)
+            print('########')
+            exit(1)
+        with open(fileName,'r+b') as f:
+            f.truncate(size)
+        mode='a'
+    if fileName[-3:]!='.gz':
+        return(open(fileName,mode))
+    else:
+        return(gzip.open(fileName,mode+'t'))
+
+def syncReadsFiles(readsFiles):
+    # This function writes all reads from buffers to disk and returns sizes of files
+    # Gzipped files are closed and opened again, so they consist of complete gzip-members
+    readsFilesSizes={}
+    for fileName in readsFiles.keys():
+        if fileName[-3:]!='.gz':
+            readsFiles[fileName].flush()
+            os.fsync(readsFiles[fileName].fileno())
+        else:
+            readsFiles[fileName].close()
+            with open(fileName,'ab') as f:
+                os.fsync(f.fileno())
+            readsFiles[fileName]=openReadsFile(fileName,os.path.getsize(fileName))
+        readsFilesSizes[fileName]=os.path.getsize(fileName)
+    return(readsFilesSizes)
+
+def readFastq(fileName,skip=0):
+    # This function returns iterator over records of fastq-file, files with extension .gz are gzipped
+    # skip - number of the first records that are skipped as 4 lines without parsing
+    from Bio import SeqIO
+    if fileName[-3:]!='.gz':
+        f=open(fileName)
+    else:
+        f=gzip.open(fileName,'rt')
+    deque(islice(f,skip*4),maxlen=0)
+    return(SeqIO.parse(f,'fastq'))
+
+def saveCheckpoint(checkpointFile,checkpoint):
+    # Checkpoint is written to the temporary file at first,
+    # so the previous checkpoint is kept if the run is interrupted during writing
+    with open(checkpointFile+'.tmp','wb') as f:
+        pickle.dump(checkpoint,f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(checkpointFile+'.tmp',checkpointFile)
+
+def loadCheckpoint(checkpointFile):
+    with open(checkpointFile,'rb') as f:
+        return(pickle.load(f))
+
 def revComplement(nuc):
+    from Bio.Seq import Seq
     return(str(Seq(nuc).reverse_complement()))
 
 def countDifs(s1,s2):
+    from Bio import pairwise2
     a=pairwise2.align.globalms(s1,s2,2,-1,-1.53,0)
     maxSum=0
     k=0
@@ -97,6 +140,7 @@ def getErrors(s1,s2):
     # This function calculates number of errors between designed and sequenced primer sequences
     # s1 - initial sequence of primer
     # s2 - sequenced sequece of primer
+    from Bio import pairwise2
     # Align them
     a=pairwise2.align.localms(s1,s2,2,-1,-1.53,0)
     maxSum=0
@@ -123,6 +167,102 @@ def getErrors(s1,s2):
             muts.append(b+'/'+c)
     return(poses,muts)
 
+def countPrimerErrors(item,primersErrors,primersErrorsPos,primersErrorsType,primersR1_5,primersR2_5,paired):
+    # This function adds errors in primers of one pair of reads to statistics
+    # item - errors of TrimResult: [[number of primer R1_5,number of primer R2_5],difs1,difs2,difs3,difs4]
+    # primersErrors is a dictionary that contains errors in primers
+    # primersErrorsPos is a dictionary that contains statistics about location of errors
+    # primersErrorsType is a dictionary that contains statistics about type of error
+    from Bio import pairwise2
+    itemkey = str(item[0][0]) + '+' + str(item[0][1])
+
+    # If key for this primer has not been created, yet
+    if not itemkey in primersErrors.keys():
+        # For each primer of each pair we will gather the following values:
+        # [(0)number of read pairs,
+        # (1)number of primers without errors,
+        # (2)number of primers with sequencing errors,
+        # (3)number of primers with synthesis errors
+        # The first item of list - F
+        # The second - R
+        primersErrors[itemkey]=[[0,0,0,0],[0,0,0,0]]
+
+##          R                           F_reverse_complement
+## R1 5'---------________________________---------3'
+## R2 5'---------________________________---------3'
+##          F                           R_reverse_complement
+
+    # NOTICE: F is R2 5p primer
+    # Increase number of read pairs
+    primersErrors[itemkey][0][0]+=1
+    primersErrors[itemkey][1][0]+=1
+    # F-primers of pairs
+    # The last variant is a case when we have single-end reads and 3' does not contain primer sequence
+    # add to number of read pairs without errors
+    if paired and item[3][0:3]==(0,0,0):
+        primersErrors[itemkey][0][1]+=1
+    # If it was overlapping paired-end reads, we try to check if this is sequencing error
+    elif item[2][3]!='' and item[3][3]!='':
+        # Rererse complement one of primer sequences
+        rev=revComplement(item[2][3])
+        a=pairwise2.align.globalms(rev,item[3][3],2,-1,-1.53,-0.1)
+        # If found sequences are identical, it's a synthesis error
+        if list(a[0][0])==list(a[0][1]):
+            primersErrors[itemkey][0][3]+=1
+            # Now we want to save information about error's location
+            poses,muts=getErrors(primersR2_5[item[0][0]][1:-1],item[3][3])
+            for p in poses:
+                if p not in primersErrorsPos.keys():
+                    primersErrorsPos[p]=1
+                else:
+                    primersErrorsPos[p]+=1
+            for m in muts:
+                if m not in primersErrorsType.keys():
+                    primersErrorsType[m]=1
+                else:
+                    primersErrorsType[m]+=1
+        # Else it's a sequencing error
+        else:
+            primersErrors[itemkey][0][2]+=1
+    # Else we just save it as sequencing error
+    else:
+        primersErrors[itemkey][0][2]+=1
+    # R-primers of pairs
+    # For R-primer we always have sequence at least at 5' end of R1
+    if item[1][0:3]==(0,0,0):
+        primersErrors[itemkey][1][1]+=1
+    # If it was overlapping paired-end reads, we try to check if this is sequencing error
+    elif item[4][3]!='' and item[1][3]!='':
+        # Rererse complement one of primer sequences
+        rev=revComplement(item[4][3])
+        a=pairwise2.align.globalms(rev,item[1][3],2,-1,-1.53,-0.1)
+        # If found sequences are identical, it's a synthesis error
+        try:
+            if list(a[0][0])==list(a[0][1]):
+                primersErrors[itemkey][1][3]+=1
+                # Now we want to save information about error's location
+                poses,muts=getErrors(primersR1_5[item[0][0]][1:-1],item[1][3])
+                for p in poses:
+                    if p not in primersErrorsPos.keys():
+                        primersErrorsPos[p]=1
+                    else:
+                        primersErrorsPos[p]+=1
+                for m in muts:
+                    if m not in primersErrorsType.keys():
+                        primersErrorsType[m]=1
+                    else:
+                        primersErrorsType[m]+=1
+            # Else it's a sequencing error
+            else:
+                primersErrors[itemkey][1][2]+=1
+        except IndexError:
+            print('IndexError!',a)
+            print(item)
+            exit(4)
+    # Else we just save it as sequencing error
+    else:
+        primersErrors[itemkey][0][2]+=1
+
 def interleavedPrimerNum(x):
     return 1 - (x % 2) + int(x/2)*2
 
@@ -132,188 +272,281 @@ def hamming2(s1, s2):
         return -1
     return sum(c1 != c2 for c1, c2 in zip(s1, s2))
 
-def trimPrimers(data):
-    # This function get two records from both read files (R1 and R2)
-    # and trim them
-    # As a result it returns list
-    #[trimmedReads,untrimmedReads]
-    # resList is a variable with trimmed read sequences (0) and untrimmed read sequences (1)
-    resList=[[None,None],[None,None]]
-    r1,r2=data
-    # skip short reads less than 30bp
-#   if len(r1) < maxPrimerLen+primerLocBuf or len(r2) < maxPrimerLen+primerLocBuf:
-#       return([[None,None],[r1,r2]],[],False)
-    # check r1 & r2 is paired
-    if hamming2(r1.description, r2.description) != 1:
-        return([[None,None],[None,None]],[],False)
-    # Find primer at the 5'-end of R1 read
-    readHashes=set()
-    for l in primerR1_5_hashLens:
-        hashes,lens=makeHashes(str(r1.seq[:maxPrimerLen+primerLocBuf]),l)
-        readHashes.update(hashes)
-    matchedPrimers={}
-    for rh in readHashes:
-        if rh in primerR1_5_hashes.keys():
-            for a in primerR1_5_hashes[rh]:
-                if a not in matchedPrimers.keys():
-                    matchedPrimers[a]=1
+# Statuses of trimmed pairs of reads
+TRIMMED='trimmed'
+UNTRIMMED='untrimmed'
+# names of R1 and R2 reads are not paired
+UNPAIRED='unpaired'
+# TrimResult is a result of trimming one pair of reads
+# status - TRIMMED, UNTRIMMED or UNPAIRED
+# primers - numbers of primers (R1_5,R2_5) that were found or None
+# span1, span2 - (start,end) of R1 and R2 reads after trimming of primers, only for TRIMMED
+# errors - list with errors in primers, it is filled only if primersStatistics is set:
+#          [[number of primer R1_5,number of primer R2_5],difs1,difs2,difs3,difs4]
+TrimResult=namedtuple('TrimResult',['status','primers','span1','span2','errors'])
+
+class PrimerTrimmer(object):
+    # This class contains sequences of primers and parameters of their searching
+    # It is created once and then can be used for trimming reads in the current process
+    # (trim_pair, trim_batch) or be sent to the pool of workers
+    def __init__(self,primersFile,paired=True,errNumber=5,primerLocBuf=10,minPrimer3Len=6,
+                 primer3absent=False,primersStatistics=False,idimer=False,insa=False,rnsa=False):
+        # primersFile - fasta-file with interleaved sequences of primers
+        # paired - if reads are paired-end (R1 and R2)
+        # all other parameters are the same as parameters of command line
+        # If some primers are similar, errNumber is decreased with a warning,
+        # so the effective number of errors is kept in self.errNumber
+        # and pairs of similar primers are kept in self.similarPrimers
+        self.similarPrimers=[]
+        self.paired=paired
+        self.errNumber=int(errNumber)
+        self.primerLocBuf=primerLocBuf
+        # Sequences of primers are written in brackets, so we add 1 for '('
+        self.minPrimer3Len=minPrimer3Len+1
+        self.primer3absent=primer3absent
+        self.primersStatistics=primersStatistics
+        self.idimer=idimer
+        self.insa=insa
+        self.rnsa=rnsa
+        # Modules for searching primers are imported here, before workers of the pool
+        # are started, so workers inherit them and do not import them again
+        import regex  # noqa: F401 - preload before Pool forks
+        if primersStatistics:
+            from Bio import pairwise2  # noqa: F401 - preload before Pool forks
+        self.readPrimers(primersFile)
+
+    def readPrimers(self,primersFile):
+        # Read fasta-file with sequences of primers
+        from Bio import SeqIO
+        # maxPrimerLen - variable that contains length of the longest primer
+        self.maxPrimerLen=0
+        # primers in R1 on the 5'-end
+        self.primersR1_5=[]
+        self.primersR1_5_names=[]
+        self.primerR1_5_hashes={}
+        self.primerR1_5_hashLens=set()
+        for i,r in enumerate(SeqIO.parse(primersFile,'fasta')):
+            self.primersR1_5_names.append(r.name)
+            self.primersR1_5.append('('+str(r.seq).upper()+')')
+            partLens=math.floor(len(r.seq)/(self.errNumber+1))
+            hashes,lens=makeHashes(str(r.seq).upper(),partLens)
+            self.primerR1_5_hashLens.update(lens)
+            for h in hashes:
+                if h in self.primerR1_5_hashes.keys():
+                    self.primerR1_5_hashes[h].append(i)
                 else:
-                    matchedPrimers[a]+=1
-    bestPrimer=None
-    bestPrimerValue=None
-    goodPrimers=[]
-    goodPrimerNums=[]
-    # loop down the best rated primers, save adjacent results as good primers
-    for key,item in sorted(matchedPrimers.items(),key=itemgetter(1),reverse=True):
+                    self.primerR1_5_hashes[h]=[i]
+            if len(r.seq)>self.maxPrimerLen:
+                self.maxPrimerLen=len(r.seq)
+        if not self.rnsa:
+            # chech edit distance between each primer, warn is distance is less than -err setting
+            import editdistance
+            i=1
+            for s in self.primersR1_5[:-1]:
+                for t in self.primersR1_5[i:]:
+                    newed=editdistance.eval(s, t)
+                    if newed <= self.errNumber:
+                        self.similarPrimers.append((s,t,newed - 1))
+                        warnings.warn('similar primers might cause confusion: '+s+' / '+t+
+                                      ', number of errors was set to '+str(newed - 1))
+                        self.errNumber=newed - 1
+                i+=1
+        # primers in R2 on the 5'-end are the same, because paired primers are interleaved
+        self.primersR2_5=self.primersR1_5
+        self.primersR2_5_names=self.primersR1_5_names
+        self.primerR2_5_hashes=self.primerR1_5_hashes
+        self.primerR2_5_hashLens=self.primerR1_5_hashLens
+        # primers in R1 on the 3'-end
+        self.primersR1_3_names=[s + '_rc' for s in self.primersR1_5_names]
+        self.primersR1_3=['('+revComplement(s[1:-1])+')' for s in self.primersR1_5]
+        # primers in R2 on the 3'-end
+        self.primersR2_3=self.primersR1_3
+        self.primersR2_3_names=self.primersR1_3_names
+
+    def findPrimer5(self,seq,primers,primerHashes,primerHashLens):
+        # This function searches primer at the 5'-end of read
+        # seq - sequence of the read's 5'-end
+        # It returns match of the primer and its number or (None,None)
+        import regex
+        readHashes=set()
+        for l in primerHashLens:
+            hashes,lens=makeHashes(seq,l)
+            readHashes.update(hashes)
+        matchedPrimers={}
+        for rh in readHashes:
+            if rh in primerHashes.keys():
+                for a in primerHashes[rh]:
+                    if a not in matchedPrimers.keys():
+                        matchedPrimers[a]=1
+                    else:
+                        matchedPrimers[a]+=1
+        bestPrimer=None
+        bestPrimerValue=None
+        goodPrimers=[]
+        goodPrimerNums=[]
+        # loop down the best rated primers, save adjacent results as good primers
+        for key,item in sorted(matchedPrimers.items(),key=itemgetter(1),reverse=True):
+            if bestPrimer==None:
+                bestPrimer=key
+                bestPrimerValue=item
+                continue
+            if item>=bestPrimerValue-1:
+                goodPrimers.append(primers[key])
+                goodPrimerNums.append(key)
+            else: break
         if bestPrimer==None:
-            bestPrimer=key
-            bestPrimerValue=item
-            continue
-        if item>=bestPrimerValue-1:
-            goodPrimers.append(primersR1_5[key])
-            goodPrimerNums.append(key)
-        else: break
-    if bestPrimer!=None:
-        m1=regex.search(r''+primersR1_5[bestPrimer]+'{e<='+errNumber+'}',str(r1.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-    else:
-        return([[None,None],[r1,r2]],[],False)
-##    m1=regex.search(r'(?:'+'|'.join(primersR1_5)+'){e<='+errNumber+'}',str(r1.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-    # Use result of searching 5'-primer
-    if m1==None:
+            return(None,None)
+        errNumber=str(self.errNumber)
+        m=regex.search(r''+primers[bestPrimer]+'{e<='+errNumber+'}',seq,flags=regex.BESTMATCH)
+        if m!=None:
+            return(m,bestPrimer)
         if len(goodPrimers)>0:
-            m1=regex.search(r'(?:'+'|'.join(goodPrimers)+'){e<='+errNumber+'}',str(r1.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-            if m1==None:
-                # Save this pair of reads to untrimmed sequences
-                return([[None,None],[r1,r2]],[],False)
-            else:
-                primerNum=goodPrimerNums[list(m1.groups()).index(m1[0])]
-        else:
-            return([[None,None],[r1,r2]],[],False)
-    else:
-        primerNum=bestPrimer
-    # Find primer at the 5'-end of R2 read
-    if readsFileR2:
+            m=regex.search(r'(?:'+'|'.join(goodPrimers)+'){e<='+errNumber+'}',seq,flags=regex.BESTMATCH)
+            if m!=None:
+                return(m,goodPrimerNums[list(m.groups()).index(m[0])])
+        return(None,None)
+
+    def trim_pair(self,r1,r2=None):
+        # This function gets two records from both read files (R1 and R2)
+        # and trims them. For single-end reads r2 is None
+        # As a result it returns TrimResult, records of trimmed reads can be got with getRecords
+        import regex
+        if self.paired and r2 is None:
+            raise ValueError('R2 read is required for paired-end reads')
+        errNumber=str(self.errNumber)
+        # searchLen - length of read's ends where primers are searched
+        searchLen=self.maxPrimerLen+self.primerLocBuf
+        # check r1 & r2 is paired
+        if self.paired and hamming2(r1.description, r2.description) != 1:
+            return(TrimResult(UNPAIRED,None,None,None,[]))
+        # Find primer at the 5'-end of R1 read
+        m1,primerNum=self.findPrimer5(str(r1.seq[:searchLen]),self.primersR1_5,
+                                      self.primerR1_5_hashes,self.primerR1_5_hashLens)
+        if m1==None:
+            # Save this pair of reads to untrimmed sequences
+            return(TrimResult(UNTRIMMED,None,None,None,[]))
         # asign paired primer num to primerPairNum, because all primers are interleaved in primer file
-        primerPairNum = interleavedPrimerNum(primerNum)
-        m3=regex.search(r'(?:'+primersR2_5[primerPairNum]+'){e<='+errNumber+'}',str(r2.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-        if m3==None:
+        primerPairNum=interleavedPrimerNum(primerNum)
+        # Find primer at the 5'-end of R2 read
+        if self.paired:
+            m3=regex.search(r'(?:'+self.primersR2_5[primerPairNum]+'){e<='+errNumber+'}',str(r2.seq[:searchLen]),flags=regex.BESTMATCH)
+            if m3!=None:
+                primerNum2=primerPairNum
             # If user wants to identify hetero- and homodimers of primers
-            if idimer or insa:
-                readHashes=set()
-                for l in primerR2_5_hashLens:
-                    hashes,lens=makeHashes(str(r2.seq[:maxPrimerLen+primerLocBuf]),l)
-                    readHashes.update(hashes)
-                matchedPrimers={}
-                for rh in readHashes:
-                    if rh in primerR2_5_hashes.keys():
-                        for a in primerR2_5_hashes[rh]:
-                            if a not in matchedPrimers.keys():
-                                matchedPrimers[a]=1
-                            else:
-                                matchedPrimers[a]+=1
-                bestPrimer=None
-                bestPrimerValue=None
-                goodPrimers=[]
-                goodPrimerNums=[]
-                for key,item in sorted(matchedPrimers.items(),key=itemgetter(1),reverse=True):
-                    if bestPrimer==None:
-                        bestPrimer=key
-                        bestPrimerValue=item
-                        continue
-                    if item>=bestPrimerValue-1:
-                        goodPrimers.append(primersR2_5[key])
-                        goodPrimerNums.append(key)
-                    else: break
-                if bestPrimer!=None:
-                    m3=regex.search(r''+primersR2_5[bestPrimer]+'{e<='+errNumber+'}',str(r2.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-                else:
-                    return([[None,None],[r1,r2]],[],False)
-##                    m3=regex.search(r'(?:'+'|'.join(primersR2_5)+'){e<='+errNumber+'}',str(r2.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-                # Use result of searching 5'-primer
+            elif self.idimer or self.insa:
+                m3,primerNum2=self.findPrimer5(str(r2.seq[:searchLen]),self.primersR2_5,
+                                               self.primerR2_5_hashes,self.primerR2_5_hashLens)
                 if m3==None:
-                    if len(goodPrimers)>0:
-                        m3=regex.search(r'(?:'+'|'.join(goodPrimers)+'){e<='+errNumber+'}',str(r2.seq[:maxPrimerLen+primerLocBuf]),flags=regex.BESTMATCH)
-                        if m3==None:
-                            # Save this pair of reads to untrimmed sequences
-                            return([[None,None],[r1,r2]],[],False)
-                        else:
-                            primerNum2=goodPrimerNums[list(m3.groups()).index(m3[0])]
-                    else:
-                        return([[None,None],[r1,r2]],[],False)
-                else:
-                    primerNum2=bestPrimer
-                if not rnsa:
+                    # Save this pair of reads to untrimmed sequences
+                    return(TrimResult(UNTRIMMED,None,None,None,[]))
+                if not self.rnsa:
                     # If we found two different, two primer must be paired correctly
                     if abs(primerNum - primerNum2) != 1 or max(primerNum, primerNum2) % 2 == 0:
-                        return([[None,None],[r1,r2]],[],[primerNum,primerNum2])
+                        return(TrimResult(UNTRIMMED,(primerNum,primerNum2),None,None,[]))
             else:
                 # Save this pair of reads to untrimmed sequences
-                return([[None,None],[r1,r2]],[],False)
+                return(TrimResult(UNTRIMMED,None,None,None,[]))
         else:
             primerNum2=primerPairNum
-    # Find primer at the 3'-end of R1 read
-    # errNumber in 3p end
-    errNumberDescreased=int(int(errNumber)*minPrimer3Len/len(primersR1_3[primerNum2][:-2]))
-    m2=regex.search(r'(?:'+primersR1_3[primerNum2][:minPrimer3Len]+')){e<='+str(errNumberDescreased)+'}',str(r1.seq[-maxPrimerLen-primerLocBuf:]),flags=regex.BESTMATCH)
-    if m2!=None:
-        lenR1_3primer=maxPrimerLen+primerLocBuf-m2.span()[0]
-        if lenR1_3primer > len(primersR1_3[primerNum2]) - 2:
-            m2=None
-        else:
-            hd2=hamming2(r1.seq[-lenR1_3primer:],primersR1_3[primerNum2][1:1+lenR1_3primer])
-            errNumberDescreased2=int(int(errNumber)*lenR1_3primer/len(primersR1_3[primerNum2][:-2]))
-            if hd2 > int(errNumberDescreased2):
+        # Find primer at the 3'-end of R1 read
+        # errNumber in 3p end
+        errNumberDescreased=int(self.errNumber*self.minPrimer3Len/len(self.primersR1_3[primerNum2][:-2]))
+        m2=regex.search(r'(?:'+self.primersR1_3[primerNum2][:self.minPrimer3Len]+')){e<='+str(errNumberDescreased)+'}',str(r1.seq[-searchLen:]),flags=regex.BESTMATCH)
+        if m2!=None:
+            lenR1_3primer=searchLen-m2.span()[0]
+            if lenR1_3primer > len(self.primersR1_3[primerNum2]) - 2:
                 m2=None
-    if not primer3absent and m2==None:
-        # Save this pair of reads to untrimmed sequences
-        return([[None,None],[r1,r2]],[],[primerNum,primerNum2])
-    # Find primer at the 3'-end of R2 read
-    if readsFileR2:
-        errNumberDescreased=int(round(int(errNumber)*minPrimer3Len/len(primersR2_3[primerNum][:-2])))
-        m4=regex.search(r'(?:'+primersR2_3[primerNum][:minPrimer3Len]+')){e<='+str(errNumberDescreased)+'}',str(r2.seq[-maxPrimerLen-primerLocBuf:]),flags=regex.BESTMATCH)
-        if m4!=None:
-            lenR2_3primer=maxPrimerLen+primerLocBuf-m4.span()[0]
-            if lenR2_3primer > len(primersR2_3[primerNum]) - 2:
-                m4=None
             else:
-                hd4=hamming2(r2.seq[-lenR2_3primer:],primersR2_3[primerNum][1:1+lenR2_3primer])
-                errNumberDescreased4=int(int(errNumber)*lenR2_3primer/len(primersR2_3[primerNum][:-2]))
-                if hd4 > int(errNumberDescreased4):
-                    m4=None
-        if not primer3absent and m4==None:
+                hd2=hamming2(r1.seq[-lenR1_3primer:],self.primersR1_3[primerNum2][1:1+lenR1_3primer])
+                errNumberDescreased2=int(self.errNumber*lenR1_3primer/len(self.primersR1_3[primerNum2][:-2]))
+                if hd2 > int(errNumberDescreased2):
+                    m2=None
+        if not self.primer3absent and m2==None:
             # Save this pair of reads to untrimmed sequences
-            return([[None,None],[r1,r2]],[],[primerNum,primerNum2])
-    # If all primers were found
-    # Trim sequences of primers and write them to result file
-    if m2!=None:
-        resList[0][0]=r1[m1.span()[1]:len(r1.seq)-maxPrimerLen-primerLocBuf+m2.span()[0]]
-    else:
-        resList[0][0]=r1[m1.span()[1]:]
-    resList[0][0].description += " " + primersR1_5_names[primerNum]
-    if readsFileR2:
-        if m4!=None:
-            resList[0][1]=r2[m3.span()[1]:len(r2.seq)-maxPrimerLen-primerLocBuf+m4.span()[0]]
+            return(TrimResult(UNTRIMMED,(primerNum,primerNum2),None,None,[]))
+        # Find primer at the 3'-end of R2 read
+        if self.paired:
+            errNumberDescreased=int(round(self.errNumber*self.minPrimer3Len/len(self.primersR2_3[primerNum][:-2])))
+            m4=regex.search(r'(?:'+self.primersR2_3[primerNum][:self.minPrimer3Len]+')){e<='+str(errNumberDescreased)+'}',str(r2.seq[-searchLen:]),flags=regex.BESTMATCH)
+            if m4!=None:
+                lenR2_3primer=searchLen-m4.span()[0]
+                if lenR2_3primer > len(self.primersR2_3[primerNum]) - 2:
+                    m4=None
+                else:
+                    hd4=hamming2(r2.seq[-lenR2_3primer:],self.primersR2_3[primerNum][1:1+lenR2_3primer])
+                    errNumberDescreased4=int(self.errNumber*lenR2_3primer/len(self.primersR2_3[primerNum][:-2]))
+                    if hd4 > int(errNumberDescreased4):
+                        m4=None
+            if not self.primer3absent and m4==None:
+                # Save this pair of reads to untrimmed sequences
+                return(TrimResult(UNTRIMMED,(primerNum,primerNum2),None,None,[]))
+        # If all primers were found
+        # Get coordinates of reads without primers
+        if m2!=None:
+            span1=(m1.span()[1],len(r1.seq)-searchLen+m2.span()[0])
         else:
-            resList[0][1]=r2[m3.span()[1]:]
-        resList[0][1].description += " " + primersR2_5_names[primerNum2]
-    # discard reads length < 20 after primer-trimming
-    if len(resList[0][0].seq) < 20 or len(resList[0][1].seq) < 20:
-        return([[None,None],[r1,r2]],[],[primerNum,primerNum2])
-    # Save number of errors and primers sequences
-    # [number of primer,difs1,difs2,difs3,difs4,]
-    # Each dif is a set of (# of mismatches,# of insertions,# of deletions,primer_seq)
-    if primersStatistics:
-        difs1=countDifs(m1[0],primersR1_5[primerNum][1:-1])
-        if m2!=None: difs2=countDifs(m2[0],primersR1_3[primerNum2][1:-1])
-        else: difs2=(0,0,0,'')
-        if readsFileR2: difs3=countDifs(m3[0],primersR2_5[primerNum2][1:-1])
-        else: difs3=(0,0,0,'')
-        if readsFileR2 and m4!=None: difs4=countDifs(m4[0],primersR2_3[primerNum][1:-1])
-        else: difs4=(0,0,0,'')
-        return (resList,[[primerNum,primerNum2],difs1,difs2,difs3,difs4],False)
-    else:
-        return (resList,[],False)
-    
+            span1=(m1.span()[1],len(r1.seq))
+        span2=None
+        if self.paired:
+            if m4!=None:
+                span2=(m3.span()[1],len(r2.seq)-searchLen+m4.span()[0])
+            else:
+                span2=(m3.span()[1],len(r2.seq))
+        # discard reads length < 20 after primer-trimming
+        if len(r1.seq[span1[0]:span1[1]]) < 20 or (self.paired and len(r2.seq[span2[0]:span2[1]]) < 20):
+            return(TrimResult(UNTRIMMED,(primerNum,primerNum2),None,None,[]))
+        # Save number of errors and primers sequences
+        # [number of primer,difs1,difs2,difs3,difs4,]
+        # Each dif is a set of (# of mismatches,# of insertions,# of deletions,primer_seq)
+        if self.primersStatistics:
+            difs1=countDifs(m1[0],self.primersR1_5[primerNum][1:-1])
+            if m2!=None: difs2=countDifs(m2[0],self.primersR1_3[primerNum2][1:-1])
+            else: difs2=(0,0,0,'')
+            if self.paired: difs3=countDifs(m3[0],self.primersR2_5[primerNum2][1:-1])
+            else: difs3=(0,0,0,'')
+            if self.paired and m4!=None: difs4=countDifs(m4[0],self.primersR2_3[primerNum][1:-1])
+            else: difs4=(0,0,0,'')
+            return(TrimResult(TRIMMED,(primerNum,primerNum2),span1,span2,[[primerNum,primerNum2],difs1,difs2,difs3,difs4]))
+        else:
+            return(TrimResult(TRIMMED,(primerNum,primerNum2),span1,span2,[]))
+
+    def trim_batch(self,pairs):
+        # This function trims list of pairs of reads (r1,r2) in the current process
+        # For single-end reads list may contain records of R1 reads or pairs (r1,None)
+        # As a result it returns list of TrimResult in the same order
+        trimPair=self.trim_pair
+        if self.paired:
+            return([trimPair(r1,r2) for r1,r2 in pairs])
+        return([trimPair(r) if not isinstance(r,tuple) else trimPair(*r) for r in pairs])
+
+    def getRecords(self,r1,r2,res):
+        # This function returns records of reads that should be written for the result of trim_pair
+        # For TRIMMED reads they are trimmed and labeled with names of primers,
+        # for UNTRIMMED reads they are the initial reads and for UNPAIRED reads they are (None,None)
+        if res.status==UNPAIRED:
+            return(None,None)
+        if res.status==UNTRIMMED:
+            return(r1,r2)
+        t1=r1[res.span1[0]:res.span1[1]]
+        t1.description += " " + self.primersR1_5_names[res.primers[0]]
+        t2=None
+        if self.paired:
+            t2=r2[res.span2[0]:res.span2[1]]
+            t2.description += " " + self.primersR2_5_names[res.primers[1]]
+        return(t1,t2)
+
+def initializer(trimmer2):
+    # Each worker of the pool gets its own copy of PrimerTrimmer
+    global trimmer
+    trimmer=trimmer2
+
+def trimPrimers(data):
+    # This function is called by workers of the pool for each pair of reads
+    # It returns TrimResult and records of reads that should be written
+    r1,r2=data
+    res=trimmer.trim_pair(r1,r2)
+    return(res,trimmer.getRecords(r1,r2,res))
+
 if __name__ == "__main__":    
     # Section of reading arguments
     par=argparse.ArgumentParser(description='This script cuts primers from reads sequences')
@@ -333,6 +566,9 @@ if __name__ == "__main__":
     par.add_argument('--identify-nsa','-insa',dest='insa',type=str,help='use this parameter if you want to get statistics of primers non-specific amplification products. Choose file to which statistics will be written. This parameter may slightly decrease the speed of analysis')
     par.add_argument('--nsa-reserve','-rnsa',dest='rnsa',action='store_true',help="if want to reserve non-specific amplcons, use this parameter")
     par.add_argument('--threads','-t',dest='threads',type=int,help='number of threads',default=2)
+    par.add_argument('--checkpoint','-ch',dest='checkpoint',type=str,help='directory for checkpoints. If it is set, reads are written in the same order as in the input files, and the position in input files, output files and statistics are saved regularly, so the interrupted run can be continued with --resume')
+    par.add_argument('--checkpoint-interval','-chi',dest='checkpointInterval',type=int,help='number of reads between checkpoints. Default: 1000000',default=1000000)
+    par.add_argument('--resume',dest='resume',action='store_true',help='continue the interrupted run from the last checkpoint in the directory set by --checkpoint. Parameters must be the same as in the interrupted run')
     par.add_argument('--version','-v',action='version',help='print version information',version="cutPrimers version " + __version__ +", https://github.com/ray1919/cutPrimers")
     args=par.parse_args()
     print('The command was:\n',' '.join(sys.argv))
@@ -340,61 +576,61 @@ if __name__ == "__main__":
     readsFileR2=args.readsFile2
     primersFile=args.primersFile
     primer3absent=args.primer3absent
-    minPrimer3Len=args.minPrimer3Len+1
-    errNumber=str(args.errNumber)
     primerLocBuf=args.primerLocBuf
     primersStatistics=args.primersStatistics
     idimer=args.idimer
     insa=args.insa
     rnsa=args.rnsa
-    try:
-        if args.trimmedReadsR1[-3:]!='.gz':
-            trimmedReadsR1=open(args.trimmedReadsR1,'w')
-        else:
-            trimmedReadsR1=gzip.open(args.trimmedReadsR1,'wt')
-    except FileNotFoundError:
-        print('########')
-        print('ERROR! Could not create file:',args.trimmedReadsR1)
-        print('########')
-        exit(1)
-    if args.trimmedReadsR2:
+    # Checkpoint keeps position in input files, sizes of output files and statistics
+    # of the last checkpoint, so interrupted run can be continued from it
+    checkpointFile=None
+    checkpoint=None
+    checkpointArgs=dict((key,item) for key,item in vars(args).items() if key not in ('threads','resume','checkpointInterval'))
+    if args.resume and not args.checkpoint:
+        par.error('--resume can be used only with --checkpoint')
+    if args.checkpointInterval<1:
+        par.error('--checkpoint-interval should be a positive number')
+    if args.checkpoint:
         try:
-            if args.trimmedReadsR2[-3:]!='.gz':
-                trimmedReadsR2=open(args.trimmedReadsR2,'w')
+            os.makedirs(args.checkpoint,exist_ok=True)
+        except OSError:
+            print('########')
+            print('ERROR! Could not create directory:',args.checkpoint)
+            print('########')
+            exit(1)
+        checkpointFile=os.path.join(args.checkpoint,'cutPrimers.checkpoint')
+        if args.resume:
+            if os.path.exists(checkpointFile):
+                checkpoint=loadCheckpoint(checkpointFile)
+                if checkpoint['args']!=checkpointArgs:
+                    print('########')
+                    print('ERROR! Parameters differ from parameters of the checkpoint:',checkpointFile)
+                    print('########')
+                    exit(1)
+                print('Resuming from checkpoint after',checkpoint['doneWork'],'reads...')
             else:
-                trimmedReadsR2=gzip.open(args.trimmedReadsR2,'wt')
+                print('Warning! Checkpoint was not found, so trimming will be started from the beginning')
+        elif os.path.exists(checkpointFile):
+            # New run rewrites output files, so checkpoint of the previous run is not valid anymore
+            os.remove(checkpointFile)
+    # Files for trimmed and untrimmed reads. The same name means the same file
+    readsFilesNames=[args.trimmedReadsR1,args.untrimmedReadsR1,args.trimmedReadsR2,args.untrimmedReadsR2]
+    readsFiles={}
+    for fileName in readsFilesNames:
+        if fileName is None or fileName in readsFiles.keys():
+            continue
+        try:
+            if checkpoint:
+                # Reads that were written after the checkpoint are removed
+                readsFiles[fileName]=openReadsFile(fileName,checkpoint['readsFilesSizes'][fileName])
+            else:
+                readsFiles[fileName]=openReadsFile(fileName)
         except FileNotFoundError:
             print('########')
-            print('ERROR! Could not create file:',args.trimmedReadsR2)
+            print('ERROR! Could not create file:',fileName)
             print('########')
             exit(1)
-        if args.untrimmedReadsR1==args.trimmedReadsR1:
-            untrimmedReadsR1=trimmedReadsR1
-        else:
-            try:
-                if args.untrimmedReadsR1[-3:]!='.gz':
-                    untrimmedReadsR1=open(args.untrimmedReadsR1,'w')
-                else:
-                    untrimmedReadsR1=gzip.open(args.untrimmedReadsR1,'wt')
-            except FileNotFoundError:
-                print('########')
-                print('ERROR! Could not create file:',args.untrimmedReadsR1)
-                print('########')
-                exit(1)
-    if args.untrimmedReadsR2:
-        if args.untrimmedReadsR2==args.trimmedReadsR2:
-            untrimmedReadsR2=trimmedReadsR2
-        else:
-            try:
-                if args.untrimmedReadsR2[-3:]!='.gz':
-                    untrimmedReadsR2=open(args.untrimmedReadsR2,'w')
-                else:
-                    untrimmedReadsR2=gzip.open(args.untrimmedReadsR2,'wt')
-            except FileNotFoundError:
-                print('########')
-                print('ERROR! Could not create file:',args.untrimmedReadsR2)
-                print('########')
-                exit(1)
+    trimmedReadsR1,untrimmedReadsR1,trimmedReadsR2,untrimmedReadsR2=[readsFiles.get(f) for f in readsFilesNames]
     if (idimer or insa) and not readsFileR2:
 #   if idimer and not readsFileR2:
         print('Warning! You did not provide R2-file so parameter "-idimer/insa" will be ignored')
@@ -408,7 +644,6 @@ if __name__ == "__main__":
             print('ERROR! Could not create file:',idimer)
             print('########')
             exit(1)
-        primerDimers={}
     if insa:
         try:
             insaFile=open(insa,'w')
@@ -417,7 +652,6 @@ if __name__ == "__main__":
             print('ERROR! Could not create file:',insa)
             print('########')
             exit(1)
-        primerNSAs={}
     if primersStatistics:
         primersStatistics=open(args.primersStatistics,'w')
         primersStatisticsPos=open(args.primersStatistics[:-4]+'_poses.tab','w')
@@ -426,63 +660,31 @@ if __name__ == "__main__":
 
     # Read fasta-files with sequences of primers
     print('Reading files of primers...')
-    lastPrimerNum=0
-    # maxPrimerLen - variable that contains length of the longest primer
-    maxPrimerLen=0
-    # primers in R1 on the 5'-end
-    primersR1_5=[]
-    primersR1_5_names=[]
-    primerR1_5_hashes={}
-    primerR1_5_hashLens=set()
-    i=0
     try:
-        for r in SeqIO.parse(primersFile,'fasta'):
-            primersR1_5_names.append(r.name)
-            primersR1_5.append('('+str(r.seq).upper()+')')
-            partLens=math.floor(len(r.seq)/(int(errNumber)+1))
-            hashes,lens=makeHashes(str(r.seq).upper(),partLens)
-            primerR1_5_hashLens.update(lens)
-            for h in hashes:
-                if h in primerR1_5_hashes.keys():
-                    primerR1_5_hashes[h].append(i)
-                else:
-                    primerR1_5_hashes[h]=[i]
-            if len(r.seq)>maxPrimerLen:
-                maxPrimerLen=len(r.seq)
-            i+=1
+        # Similar primers are shown below, so warnings of PrimerTrimmer are not needed
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore',message='similar primers')
+            trimmer=PrimerTrimmer(primersFile,paired=bool(readsFileR2),errNumber=args.errNumber,
+                                  primerLocBuf=primerLocBuf,minPrimer3Len=args.minPrimer3Len,
+                                  primer3absent=primer3absent,primersStatistics=bool(primersStatistics),
+                                  idimer=bool(idimer),insa=bool(insa),rnsa=rnsa)
     except FileNotFoundError:
         print('########')
         print('ERROR! File not found:',primersFile)
         print('########')
         exit(2)
-    if not rnsa:
-        # chech edit distance between each primer, warn is distance is less than -err setting
-        i=1
-        for s in primersR1_5[:-1]:
-            for t in primersR1_5[i:]:
-                newed=editdistance.eval(s, t)
-                if newed <= int(errNumber):
-                    print('########')
-                    print('WARN! similar primers might cause confusion: ', s, '/', t)
-                    print('--error-number was set to ', newed - 1 )
-                    print('########')
-                    errNumber=str(newed - 1)
-            i+=1
-    # primers in R2 on the 5'-end
-    if readsFileR2:
-        primersR2_5=primersR1_5
-        primersR2_5_names=primersR1_5_names
-        primerR2_5_hashes=primerR1_5_hashes
-        primerR2_5_hashLens=primerR1_5_hashLens
-    else:
-        primersR2_5=None
-    # primers in R1 on the 3'-end
-    primersR1_3_names=[s + '_rc' for s in primersR1_5_names]
-    primersR1_3=['('+revComplement(s[1:-1])+')' for s in primersR1_5]
-    # primers in R2 on the 3'-end
-    if readsFileR2:
-        primersR2_3=primersR1_3
-        primersR2_3_names=primersR1_3_names
+    # maxPrimerLen - variable that contains length of the longest primer
+    maxPrimerLen=trimmer.maxPrimerLen
+    errNumber=trimmer.errNumber
+    for s,t,newErrNumber in trimmer.similarPrimers:
+        print('########')
+        print('WARN! similar primers might cause confusion: ', s, '/', t)
+        print('--error-number was set to ', newErrNumber )
+        print('########')
+    primersR1_5=trimmer.primersR1_5
+    primersR1_5_names=trimmer.primersR1_5_names
+    primersR2_5=trimmer.primersR2_5
+    primersR2_5_names=trimmer.primersR2_5_names
     # Read file with R1 and R2 reads
     try:
         if readsFileR1[-3:]!='.gz':
@@ -495,175 +697,99 @@ if __name__ == "__main__":
         print('########')
         exit(2)
     print('Reading input FASTQ-file(s)...')
-    if readsFileR1[-3:]!='.gz':
-        data1=SeqIO.parse(readsFileR1,'fastq')
-    else:
-        data1=SeqIO.parse(gzip.open(readsFileR1,'rt'),'fastq')
+    from Bio import SeqIO
+    # Reads that were processed before the checkpoint are skipped
+    skipWork=0
+    if checkpoint:
+        skipWork=checkpoint['doneWork']
+    data1=readFastq(readsFileR1,skipWork)
     if readsFileR2:
         try:
-            if readsFileR2[-3:]!='.gz':
-                data2=SeqIO.parse(readsFileR2,'fastq')
-            else:
-                data2=SeqIO.parse(gzip.open(readsFileR2,'rt'),'fastq')
+            data2=readFastq(readsFileR2,skipWork)
         except FileNotFoundError:
             print('########')
             print('ERROR! Could not open file:',readsFileR2)
             print('########')
             exit(2)
     else:
-        data2=['']*int(allWork)
+        data2=repeat(None)
     # Create Queue for storing result and Pool for multiprocessing
-    primerErrorQ=[]
-    p=Pool(threads,initializer,(maxPrimerLen,primerLocBuf,errNumber,primersR1_5,primersR1_3,primersR2_5,primersR2_3,
-                                primerR1_5_hashes,primerR1_5_hashLens,primerR2_5_hashes,primerR2_5_hashLens,
-                                readsFileR2,primersStatistics,idimer,primer3absent,minPrimer3Len))
+    # Workers are started only now, when all arguments and input files were checked
+    from multiprocessing import Pool
+    primersErrors={}
+    primersErrorsPos={}
+    primersErrorsType={}
+    primerDimers={}
+    primerNSAs={}
+    doneWork=0
+    if checkpoint:
+        # Restore statistics that were collected before the checkpoint
+        doneWork=checkpoint['doneWork']
+        primersErrors=checkpoint['primersErrors']
+        primersErrorsPos=checkpoint['primersErrorsPos']
+        primersErrorsType=checkpoint['primersErrorsType']
+        primerDimers=checkpoint['primerDimers']
+        primerNSAs=checkpoint['primerNSAs']
+    p=Pool(threads,initializer,(trimmer,))
+    if checkpointFile:
+        # Results are returned in the order of input reads,
+        # so number of processed reads is a position in input files
+        results=p.imap(trimPrimers,zip(data1,data2),10)
+    else:
+        results=p.imap_unordered(trimPrimers,zip(data1,data2),10)
     # Cutting primers and writing result immediately
     print('Trimming primers from reads...')
-    doneWork=0
-    showPercWork(0,allWork)
-    for res in p.imap_unordered(trimPrimers,zip(data1,data2),10):
+    showPercWork(doneWork,allWork)
+    for res,(rec1,rec2) in results:
         doneWork+=1
         if doneWork & 500 == 0:
             showPercWork(doneWork,allWork)
-        if primersStatistics and res[1]!=[]:
-            primerErrorQ.append(res[1])
-        if readsFileR2:
-            if res[0][0][0] is not None and res[0][0][1] is not None:
-                SeqIO.write(res[0][0][0],trimmedReadsR1,'fastq')
-                SeqIO.write(res[0][0][1],trimmedReadsR2,'fastq')
-            elif res[0][1][0] is not None and res[0][1][1] is not None:
-                # If user want to identify primer-dimers
-                maxDimerLen=maxPrimerLen*2
-                if idimer and res[2] and len(res[0][1][0].seq) < maxDimerLen and len(res[0][1][1].seq) < maxDimerLen:
-                    r1partSeq=str(res[0][1][0].seq)
-                    r2partSeq=revComplement(str(res[0][1][1].seq))
-                    difs=countDifs(r1partSeq,r2partSeq)
-                    if sum(difs[0:2])<=int(errNumber):
-                        # it is a primer-dimer
-                        # and len(difs[3])>=len(primersR1_5[res[2][0]])
-                        if primersR1_5_names[res[2][0]]+' & '+primersR2_5_names[res[2][1]] not in primerDimers.keys():
-                            primerDimers[primersR1_5_names[res[2][0]]+' & '+primersR2_5_names[res[2][1]]]=1
-                        else:
-                            primerDimers[primersR1_5_names[res[2][0]]+' & '+primersR2_5_names[res[2][1]]]+=1
-                if insa and res[2] and (len(res[0][1][0].seq) >= maxDimerLen or len(res[0][1][1].seq) >= maxDimerLen):
-                    if primersR1_5_names[res[2][0]]+' & '+primersR2_5_names[res[2][1]] not in primerNSAs.keys():
-                        primerNSAs[primersR1_5_names[res[2][0]]+' & '+primersR2_5_names[res[2][1]]]=1
+        if primersStatistics and res.errors!=[]:
+            countPrimerErrors(res.errors,primersErrors,primersErrorsPos,primersErrorsType,
+                              primersR1_5,primersR2_5,bool(readsFileR2))
+        if res.status==UNPAIRED:
+            print('ERROR: nor the 1st item of function result list or 2nd contains anything')
+            print('       This might caused by mismatch of read1/read2 names.')
+            exit(3)
+        if res.status==TRIMMED:
+            SeqIO.write(rec1,trimmedReadsR1,'fastq')
+            if readsFileR2:
+                SeqIO.write(rec2,trimmedReadsR2,'fastq')
+        elif readsFileR2:
+            # If user want to identify primer-dimers
+            maxDimerLen=maxPrimerLen*2
+            if res.primers:
+                pairName=primersR1_5_names[res.primers[0]]+' & '+primersR2_5_names[res.primers[1]]
+            if idimer and res.primers and len(rec1.seq) < maxDimerLen and len(rec2.seq) < maxDimerLen:
+                r1partSeq=str(rec1.seq)
+                r2partSeq=revComplement(str(rec2.seq))
+                difs=countDifs(r1partSeq,r2partSeq)
+                if sum(difs[0:2])<=int(errNumber):
+                    # it is a primer-dimer
+                    # and len(difs[3])>=len(primersR1_5[res.primers[0]])
+                    if pairName not in primerDimers.keys():
+                        primerDimers[pairName]=1
                     else:
-                        primerNSAs[primersR1_5_names[res[2][0]]+' & '+primersR2_5_names[res[2][1]]]+=1
-                SeqIO.write(res[0][1][0],untrimmedReadsR1,'fastq')
-                SeqIO.write(res[0][1][1],untrimmedReadsR2,'fastq')
-            else:
-                print('ERROR: nor the 1st item of function result list or 2nd contains anything')
-                print('       This might caused by mismatch of read1/read2 names.')
-                exit(3)
+                        primerDimers[pairName]+=1
+            if insa and res.primers and (len(rec1.seq) >= maxDimerLen or len(rec2.seq) >= maxDimerLen):
+                if pairName not in primerNSAs.keys():
+                    primerNSAs[pairName]=1
+                else:
+                    primerNSAs[pairName]+=1
+            SeqIO.write(rec1,untrimmedReadsR1,'fastq')
+            SeqIO.write(rec2,untrimmedReadsR2,'fastq')
         else:
-            if res[0][0][0] is not None:
-                SeqIO.write(res[0][0][0],trimmedReadsR1,'fastq')
-            elif res[0][1][0] is not None:
-                SeqIO.write(res[0][1][0],untrimmedReadsR1,'fastq')
-            else:
-                print('ERROR: item of function result list contains nothing')
-                print(res)
-                exit(3)
+            SeqIO.write(rec1,untrimmedReadsR1,'fastq')
+        if checkpointFile and doneWork % args.checkpointInterval == 0:
+            # All reads before doneWork were written, so save the checkpoint
+            readsFilesSizes=syncReadsFiles(readsFiles)
+            trimmedReadsR1,untrimmedReadsR1,trimmedReadsR2,untrimmedReadsR2=[readsFiles.get(f) for f in readsFilesNames]
+            saveCheckpoint(checkpointFile,{'args':checkpointArgs,'doneWork':doneWork,'readsFilesSizes':readsFilesSizes,
+                                           'primersErrors':primersErrors,'primersErrorsPos':primersErrorsPos,
+                                           'primersErrorsType':primersErrorsType,
+                                           'primerDimers':primerDimers,'primerNSAs':primerNSAs})
     print()
-    # primersErrors is a dictionary that contains errors in primers
     if args.primersStatistics:
-        primersErrors={}
-        # primersErrorsPos is a dictionary that contains statistics about location
-        # of errors
-        primersErrorsPos={}
-        # primersErrorsType is a dictionary that contains statistics about type of error
-        primersErrorsType={}
-        print('Counting errors...')
-        for item in primerErrorQ:
-            itemkey = str(item[0][0]) + '+' + str(item[0][1])
-
-            # If key for this primer has not been created, yet
-            if not itemkey in primersErrors.keys():
-                # For each primer of each pair we will gather the following values:
-                # [(0)number of read pairs,
-                # (1)number of primers without errors,
-                # (2)number of primers with sequencing errors,
-                # (3)number of primers with synthesis errors
-                # The first item of list - F
-                # The second - R
-                primersErrors[itemkey]=[[0,0,0,0],[0,0,0,0]]
-
-##          R                           F_reverse_complement
-## R1 5'---------________________________---------3'
-## R2 5'---------________________________---------3'
-##          F                           R_reverse_complement
-
-            # NOTICE: F is R2 5p primer
-            # Increase number of read pairs
-            primersErrors[itemkey][0][0]+=1
-            primersErrors[itemkey][1][0]+=1
-            # F-primers of pairs
-            # The last variant is a case when we have single-end reads and 3' does not contain primer sequence
-            # add to number of read pairs without errors
-            if readsFileR2 and item[3][0:3]==(0,0,0):
-                primersErrors[itemkey][0][1]+=1
-            # If it was overlapping paired-end reads, we try to check if this is sequencing error
-            elif item[2][3]!='' and item[3][3]!='':
-                # Rererse complement one of primer sequences
-                rev=str(Seq(item[2][3]).reverse_complement())
-                a=pairwise2.align.globalms(rev,item[3][3],2,-1,-1.53,-0.1)
-                # If found sequences are identical, it's a synthesis error
-                if list(a[0][0])==list(a[0][1]):
-                    primersErrors[itemkey][0][3]+=1
-                    # Now we want to save information about error's location
-                    poses,muts=getErrors(primersR2_5[item[0][0]][1:-1],item[3][3])
-                    for p in poses:
-                        if p not in primersErrorsPos.keys():
-                            primersErrorsPos[p]=1
-                        else:
-                            primersErrorsPos[p]+=1
-                    for m in muts:
-                        if m not in primersErrorsType.keys():
-                            primersErrorsType[m]=1
-                        else:
-                            primersErrorsType[m]+=1
-                # Else it's a sequencing error
-                else:
-                    primersErrors[itemkey][0][2]+=1
-            # Else we just save it as sequencing error
-            else:
-                primersErrors[itemkey][0][2]+=1
-            # R-primers of pairs
-            # For R-primer we always have sequence at least at 5' end of R1
-            if item[1][0:3]==(0,0,0):
-                primersErrors[itemkey][1][1]+=1
-            # If it was overlapping paired-end reads, we try to check if this is sequencing error
-            elif item[4][3]!='' and item[1][3]!='':
-                # Rererse complement one of primer sequences
-                rev=str(Seq(item[4][3]).reverse_complement())
-                a=pairwise2.align.globalms(rev,item[1][3],2,-1,-1.53,-0.1)
-                # If found sequences are identical, it's a synthesis error
-                try:
-                    if list(a[0][0])==list(a[0][1]):
-                        primersErrors[itemkey][1][3]+=1
-                        # Now we want to save information about error's location
-                        poses,muts=getErrors(primersR1_5[item[0][0]][1:-1],item[1][3])
-                        for p in poses:
-                            if p not in primersErrorsPos.keys():
-                                primersErrorsPos[p]=1
-                            else:
-                                primersErrorsPos[p]+=1
-                        for m in muts:
-                            if m not in primersErrorsType.keys():
-                                primersErrorsType[m]=1
-                            else:
-                                primersErrorsType[m]+=1
-                    # Else it's a sequencing error
-                    else:
-                        primersErrors[itemkey][1][2]+=1
-                except IndexError:
-                    print('IndexError!',a)
-                    print(item)
-                    exit(4)
-            # Else we just save it as sequencing error
-            else:
-                primersErrors[itemkey][0][2]+=1
         #primersStatistics.write('Primer\tTotal_number_of_reads\tNumber_without_any_errors\t'
         #                        'Number_with_sequencing_errors\tNumber_with_synthesis_errors\n')
         primersStatistics.write('Primer_5p\tPrimer_3p\tTotal_number_of_reads_1\tNumber_without_any_errors_1\t'
@@ -699,10 +825,10 @@ if __name__ == "__main__":
             insaFile.write(key+'\t'+str(item)+'\n')
         insaFile.close()
 
-    trimmedReadsR1.close()
-    untrimmedReadsR1.close()
-    if args.trimmedReadsR2:
-        trimmedReadsR2.close()
-        untrimmedReadsR2.close()
+    for f in readsFiles.values():
+        f.close()
+    # The run was finished, so the checkpoint is not needed anymore
+    if checkpointFile and os.path.exists(checkpointFile):
+        os.remove(checkpointFile)
 
 